@@ -0,0 +1,252 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True, initializedcheck=False
+from cython.parallel cimport prange
+from libc.math cimport INFINITY, pow, sqrt
+
+from graphics_stuff.basic_tracer import BACKGROUND_COLOR, EPSILON, NO_SPECULAR, LightType
+
+# same shape as numba_tracer: the scene comes in as the float32 arrays on Scene,
+# the math is done in doubles, and reflections are a loop instead of recursion
+
+cdef double POS_INF = INFINITY
+cdef double C_EPSILON = EPSILON
+cdef double C_NO_SPECULAR = NO_SPECULAR
+cdef double BACKGROUND[3]
+BACKGROUND[:] = [float(c) for c in BACKGROUND_COLOR]
+
+cdef signed char AMBIENT = LightType.AMBIENT.value
+cdef signed char POINT = LightType.POINT.value
+
+
+cdef struct SceneData:
+    # vectors are packed 3 floats to an entry
+    Py_ssize_t n_spheres
+    const float* sphere_centers
+    const float* sphere_r2
+    const float* sphere_colors
+    const double* sphere_specular
+    const float* sphere_reflective
+    Py_ssize_t n_lights
+    const signed char* light_type
+    const float* light_intensity
+    const float* light_position
+    const float* light_direction
+
+
+###### algebra ######
+cdef inline double dot(const double* a, const double* b) noexcept nogil:
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+
+cdef inline double length(const double* a) noexcept nogil:
+    return sqrt(dot(a, a))
+
+
+#########################
+
+
+cdef inline bint intersect_ray_sphere(const double* origin, const double* direction, const SceneData* scene, Py_ssize_t i, double* t_1, double* t_2) noexcept nogil:
+    # direction has to be unit length, see basic_tracer.intersect_ray_sphere
+    cdef double origin_to_sphere[3]
+    cdef const float* center = scene.sphere_centers + 3*i
+    origin_to_sphere[0] = origin[0] - center[0]
+    origin_to_sphere[1] = origin[1] - center[1]
+    origin_to_sphere[2] = origin[2] - center[2]
+
+    cdef double b = dot(origin_to_sphere, direction)
+    cdef double c = dot(origin_to_sphere, origin_to_sphere) - scene.sphere_r2[i]
+
+    cdef double discriminant = b*b - c
+
+    # no real solutions, so there's no intersection
+    if discriminant < 0.0:
+        return False
+
+    cdef double sqrt_disc = sqrt(discriminant)
+
+    t_1[0] = -b + sqrt_disc
+    t_2[0] = -b - sqrt_disc
+    return True
+
+
+cdef Py_ssize_t closest_intersection(const double* origin, const double* direction, double t_min, double t_max, const SceneData* scene, double* closest_t) noexcept nogil:
+    # index of the closest sphere hit, -1 when nothing was hit
+    cdef Py_ssize_t i
+    cdef Py_ssize_t closest_sphere = -1
+    cdef double t_1, t_2
+    closest_t[0] = POS_INF
+
+    for i in range(scene.n_spheres):
+        if not intersect_ray_sphere(origin, direction, scene, i, &t_1, &t_2):
+            continue
+
+        if t_1 < closest_t[0] and t_min < t_1 < t_max:
+            closest_t[0] = t_1
+            closest_sphere = i
+
+        if t_2 < closest_t[0] and t_min < t_2 < t_max:
+            closest_t[0] = t_2
+            closest_sphere = i
+
+    return closest_sphere
+
+
+cdef bint any_intersection(const double* origin, const double* direction, double t_min, double t_max, const SceneData* scene) noexcept nogil:
+    cdef Py_ssize_t i
+    cdef double t_1, t_2
+
+    for i in range(scene.n_spheres):
+        if intersect_ray_sphere(origin, direction, scene, i, &t_1, &t_2):
+            if t_min < t_1 < t_max or t_min < t_2 < t_max:
+                return True
+    return False
+
+
+cdef double compute_lighting(const double* point, const double* normal, const double* view, double specular, const SceneData* scene) noexcept nogil:
+    # normal and view have to be unit length, see basic_tracer.compute_lighting
+    cdef Py_ssize_t i
+    cdef double ray[3]
+    cdef double t_max, inv_length_r, n_dot_r, r_dot_v
+    cdef double intensity = 0.0
+    cdef double n_dot_v = dot(normal, view)
+
+    for i in range(scene.n_lights):
+        if scene.light_type[i] == AMBIENT:
+            intensity += scene.light_intensity[i]
+            continue
+
+        if scene.light_type[i] == POINT:
+            ray[0] = scene.light_position[3*i] - point[0]
+            ray[1] = scene.light_position[3*i + 1] - point[1]
+            ray[2] = scene.light_position[3*i + 2] - point[2]
+            t_max = length(ray)
+            inv_length_r = 1.0 / t_max
+            ray[0] *= inv_length_r
+            ray[1] *= inv_length_r
+            ray[2] *= inv_length_r
+        else:
+            ray[0] = scene.light_direction[3*i]
+            ray[1] = scene.light_direction[3*i + 1]
+            ray[2] = scene.light_direction[3*i + 2]
+            t_max = POS_INF
+
+        # shadow check
+        if any_intersection(point, ray, C_EPSILON, t_max, scene):
+            continue
+
+        # diffuse lighting
+        n_dot_r = dot(normal, ray)
+        if n_dot_r > 0.0:
+            intensity += scene.light_intensity[i] * n_dot_r
+
+        # specular lighting, see basic_tracer._shiny_light
+        r_dot_v = 2.0 * n_dot_r * n_dot_v - dot(ray, view)
+        if specular != C_NO_SPECULAR and r_dot_v > 0.0:
+            intensity += scene.light_intensity[i] * pow(r_dot_v, specular)
+
+    return intensity
+
+
+cdef void trace_ray(double* origin, double* direction, double t_min, double t_max, const SceneData* scene, int recursion_depth, double* color) noexcept nogil:
+    # reflections as a loop, see numba_tracer.trace_ray
+    cdef Py_ssize_t k, closest_sphere
+    cdef double closest_t, inv_length_n, lighting, r, s, w
+    cdef double point[3]
+    cdef double normal[3]
+    cdef double view[3]
+    cdef const float* center
+    cdef double weight = 1.0
+    color[0] = color[1] = color[2] = 0.0
+
+    while True:
+        closest_sphere = closest_intersection(origin, direction, t_min, t_max, scene, &closest_t)
+
+        if closest_sphere < 0:
+            for k in range(3):
+                color[k] += weight * BACKGROUND[k]
+            return
+
+        center = scene.sphere_centers + 3*closest_sphere
+        for k in range(3):
+            point[k] = origin[k] + direction[k]*closest_t
+            normal[k] = point[k] - center[k]
+            view[k] = -direction[k]
+        inv_length_n = 1.0 / length(normal)
+        for k in range(3):
+            normal[k] *= inv_length_n
+
+        lighting = compute_lighting(point, normal, view, scene.sphere_specular[closest_sphere], scene)
+
+        r = scene.sphere_reflective[closest_sphere]
+        w = weight if recursion_depth <= 0 or r <= 0.0 else weight * (1.0 - r)
+        for k in range(3):
+            color[k] += w * scene.sphere_colors[3*closest_sphere + k] * lighting
+        if recursion_depth <= 0 or r <= 0.0:
+            return
+
+        # reflect the view ray about the normal
+        s = 2.0 * dot(normal, view)
+        for k in range(3):
+            direction[k] = normal[k]*s - view[k]
+            origin[k] = point[k]
+        t_min = C_EPSILON
+        t_max = POS_INF
+        weight *= r
+        recursion_depth -= 1
+
+
+cdef void render_row(unsigned char[:, :, ::1] pixels, Py_ssize_t j, double s_x, double s_y, double projection_plane, const double* camera_position, const SceneData* scene) noexcept nogil:
+    cdef Py_ssize_t i, k
+    cdef Py_ssize_t c_h = pixels.shape[0]
+    cdef Py_ssize_t c_w = pixels.shape[1]
+    cdef double length_d
+    cdef double origin[3]
+    cdef double direction[3]
+    cdef double color[3]
+
+    for i in range(c_w):
+        for k in range(3):
+            origin[k] = camera_position[k]
+        direction[0] = (i - c_w // 2) * s_x
+        direction[1] = (c_h // 2 - 1 - j) * s_y
+        direction[2] = projection_plane
+        length_d = length(direction)
+        for k in range(3):
+            direction[k] /= length_d
+        trace_ray(origin, direction, length_d, POS_INF, scene, 2, color)
+        for k in range(3):
+            pixels[j, i, k] = <unsigned char>min(255.0, max(0.0, color[k]))
+
+
+def render(unsigned char[:, :, ::1] pixels, double viewport_size, double projection_plane, camera_position, scene):
+    # the memoryviews keep the scene's arrays alive while SceneData points into them
+    cdef const float[:, ::1] sphere_centers = scene.sphere_centers
+    cdef const float[::1] sphere_r2 = scene.sphere_r2
+    cdef const float[:, ::1] sphere_colors = scene.sphere_colors
+    cdef const double[::1] sphere_specular = scene.sphere_specular
+    cdef const float[::1] sphere_reflective = scene.sphere_reflective
+    cdef const signed char[::1] light_type = scene.light_type
+    cdef const float[::1] light_intensity = scene.light_intensity
+    cdef const float[:, ::1] light_position = scene.light_position
+    cdef const float[:, ::1] light_direction = scene.light_direction
+
+    cdef SceneData data
+    data.n_spheres = sphere_r2.shape[0]
+    data.sphere_centers = &sphere_centers[0, 0]
+    data.sphere_r2 = &sphere_r2[0]
+    data.sphere_colors = &sphere_colors[0, 0]
+    data.sphere_specular = &sphere_specular[0]
+    data.sphere_reflective = &sphere_reflective[0]
+    data.n_lights = light_type.shape[0]
+    data.light_type = &light_type[0]
+    data.light_intensity = &light_intensity[0]
+    data.light_position = &light_position[0, 0]
+    data.light_direction = &light_direction[0, 0]
+
+    cdef double camera[3]
+    camera[:] = [float(c) for c in camera_position]
+
+    cdef double s_x = viewport_size / pixels.shape[1]
+    cdef double s_y = viewport_size / pixels.shape[0]
+    cdef Py_ssize_t j
+    for j in prange(pixels.shape[0], nogil=True, schedule='dynamic'):
+        render_row(pixels, j, s_x, s_y, projection_plane, camera, &data)
@@ -1,5 +1,11 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from functools import partial
 from math import sqrt, pow
+from typing import Optional
+
+import numpy as np
 from PIL import Image
 
 POS_INF = float('inf')
@@ -19,19 +25,14 @@ BACKGROUND_COLOR = BLACK
 # EPSILON = 0.
 # don't make points cast shadows on themselves
 EPSILON = 0.0001
+# stands in for a specular of None (a matte sphere) in Scene.sphere_specular
+NO_SPECULAR = -1
 
 
 def create_image(width: int, height: int, mode='RGB') -> Image:
     return Image.new(mode, (width, height))
 
 
-def put_pixel(img: Image, pixels, point: Vec2, color: Color) -> None:
-    p_x = int(img.width / 2. + point[0])
-    p_y = int(img.height / 2. - point[1]) - 1
-    if 0 <= p_x < img.width and 0 <= p_y < img.height:
-        pixels[p_x, p_y] = color
-
-
 ###### algebra ######
 def dot(a, b):
     return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
@@ -41,26 +42,15 @@ def length(a):
     return sqrt(dot(a, a))
 
 
-def scalar_multiply(a, s):
+def normalize(a):
+    s = 1.0 / length(a)
     return (a[0]*s, a[1]*s, a[2]*s)
 
 
-def add(a, b):
-    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
-
-
-def subtract(a, b):
-    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
-
-
 def _clamp_value(s):
     return int(min(255, max(0, s)))
 
 
-def clamp(a):
-    return (_clamp_value(a[0]), _clamp_value(a[1]), _clamp_value(a[2]))
-
-
 #########################
 
 
@@ -95,104 +85,163 @@ class Scene:
         self.background_color = background_color
         self.spheres = spheres
         self.lights = lights
+        # split by type up front, so lighting a point never has to check light types
+        self.ambient_intensity = sum(l.intensity for l in lights if l.light_type == LightType.AMBIENT)
+        self.point_lights = [(l.intensity, l.position) for l in lights if l.light_type == LightType.POINT]
+        self.directional_lights = [(l.intensity, normalize(l.direction)) for l in lights if l.light_type == LightType.DIRECTIONAL]
+        # spheres and lights again as structures of arrays, for the renderers that work on arrays.
+        # float32 is enough to store them, but not to do the math in: |CO|^2 - r^2 for the
+        # radius 5000 floor is off by more than EPSILON, so the floor shadows itself, and
+        # rays reflected off it miss what they should hit
+        self.sphere_centers = np.array([s.center for s in spheres], dtype=np.float32).reshape(-1, 3)
+        self.sphere_r2 = np.array([s.r2 for s in spheres], dtype=np.float32)
+        self.sphere_colors = np.array([s.color for s in spheres], dtype=np.float32).reshape(-1, 3)
+        self.sphere_specular = np.array([NO_SPECULAR if s.specular is None else s.specular for s in spheres], dtype=np.float64)
+        self.sphere_reflective = np.array([s.reflective for s in spheres], dtype=np.float32)
+        no_vector = (0., 0., 0.)
+        self.light_type = np.array([l.light_type.value for l in lights], dtype=np.int8)
+        self.light_intensity = np.array([l.intensity for l in lights], dtype=np.float32)
+        self.light_position = np.array([l.position or no_vector for l in lights], dtype=np.float32).reshape(-1, 3)
+        # directions are unit length, like directional_lights
+        self.light_direction = np.array([normalize(l.direction) if l.direction else no_vector for l in lights], dtype=np.float32).reshape(-1, 3)
+
+
+def intersect_ray_sphere(origin: Vec3, direction: Vec3, sphere: Sphere, t_min: float, t_max: float) -> float:
+    # direction has to be unit length. then a = 1, and with b halved the roots
+    # are -b +- sqrt(b*b - c). returns the nearest root past t_min, or POS_INF
+    # when the whole sphere is further than t_max.
+    (o_x, o_y, o_z) = origin
+    (c_x, c_y, c_z) = sphere.center
+    (d_x, d_y, d_z) = direction
+    co_x = o_x - c_x
+    co_y = o_y - c_y
+    co_z = o_z - c_z
+
+    b = co_x*d_x + co_y*d_y + co_z*d_z
+    c = co_x*co_x + co_y*co_y + co_z*co_z - sphere.r2
+
+    # starting outside the sphere, both roots are behind us if we point away from it,
+    # and both are past t_max if its center is further than t_max + radius
+    if c > 0 and (b > 0 or c > t_max * (t_max + 2*sphere.radius)):
+        return POS_INF
+
+    discriminant = b*b - c
 
+    # no real solutions, so there's no intersection
+    if discriminant < 0:
+        return POS_INF
 
-def canvas_to_viewport(canvas_point: Vec2, img: Image, scene: Scene) -> Vec3:
-    return (canvas_point[0] * scene.viewport_size / img.width, canvas_point[1] * scene.viewport_size / img.height, scene.projection_plane)
+    sqrt_disc = sqrt(discriminant)
 
+    t = -b - sqrt_disc
+    # the near root can be behind us (leaving a surface, or starting inside), then the far one counts
+    if t <= t_min:
+        t = -b + sqrt_disc
+    return t
 
-def intersect_ray_sphere(origin: Vec3, direction: Vec3, sphere: Sphere) -> tuple[int, int]:
-    origin_to_sphere = subtract(origin, sphere.center)
 
-    a = dot(direction, direction)
-    b = 2*dot(origin_to_sphere, direction)
-    c = dot(origin_to_sphere, origin_to_sphere) - sphere.r2
+def reflect_ray(normal: Vec3, ray: Vec3) -> Vec3:
+    s = 2 * dot(normal, ray)
+    return (normal[0]*s - ray[0], normal[1]*s - ray[1], normal[2]*s - ray[2])
 
-    discriminant = b*b - (4. * a * c)
 
-    # no real solutions, so there's no intersection
-    if discriminant < 0:
-        return (POS_INF, POS_INF)
+def _diffuse_light(point: Vec3, normal: Vec3, view: Vec3, ray: Vec3, t_max: float, spheres: list[Sphere], specular: Optional[float], n_dot_v: float) -> float:
+    # diffuse only, for a unit intensity light shining along the unit vector ray.
+    # takes the same arguments as _shiny_light, so compute_lighting can pick either
+    # shadow check
+    if any_intersection(point, ray, EPSILON, t_max, spheres):
+        return 0.0
 
-    sqrt_disc = sqrt(discriminant)
+    # diffuse lighting
+    n_dot_r = dot(normal, ray)
+    return n_dot_r if n_dot_r > 0 else 0.0
 
-    t_1 = (-b + sqrt_disc) / (2. * a)
-    t_2 = (-b - sqrt_disc) / (2. * a)
-    return (t_1, t_2)
 
+def _shiny_light(point: Vec3, normal: Vec3, view: Vec3, ray: Vec3, t_max: float, spheres: list[Sphere], specular: Optional[float], n_dot_v: float) -> float:
+    # diffuse + specular for a unit intensity light shining along the unit vector ray
+    # shadow check
+    if any_intersection(point, ray, EPSILON, t_max, spheres):
+        return 0.0
 
-def reflect_ray(normal: Vec3, ray: Vec3) -> Vec3:
-    return subtract(scalar_multiply(normal, 2 * dot(normal, ray)), ray)
+    intensity = 0.0
 
+    # diffuse lighting
+    n_dot_r = dot(normal, ray)
+    if n_dot_r > 0:
+        intensity += n_dot_r
 
-def compute_lighting(point: Vec3, normal: Vec3, view: Vec3, spheres: list[Sphere], lights: list[Light], specular: int) -> float:
-    intensity = 0.0
-    length_n = length(normal)
-    length_v = length(view)
-
-    for light in lights:
-        if light.light_type == LightType.AMBIENT:
-            intensity += light.intensity
-            continue
-
-
-        if light.light_type == LightType.POINT:
-            ray = subtract(light.position, point)
-            t_max = 1.0
-        else:
-            ray = light.direction
-            t_max = POS_INF
-
-        # shadow check
-        (shadow_sphere, shadow_t) = closest_intersection(point, ray, EPSILON, t_max, spheres)
-        if shadow_sphere:
-            continue
-
-        # diffuse lighting
-        n_dot_r = dot(normal, ray)
-        if n_dot_r > 0:
-            intensity += (light.intensity * (n_dot_r / (length_n * length(ray))))
-
-        # specular lighting
-        if specular is not None:
-            reflected_ray = reflect_ray(normal, ray)
-            r_dot_v = dot(reflected_ray, view)
-            if r_dot_v > 0:
-                intensity += (light.intensity * pow(r_dot_v / (length(reflected_ray) * length_v), specular))
+    # specular lighting, the reflection of ray about a unit normal is unit length too.
+    # reflected_ray.view = 2(n.r)(n.v) - r.v, so the reflection itself isn't needed
+    r_dot_v = 2 * n_dot_r * n_dot_v - dot(ray, view)
+    if r_dot_v > 0:
+        intensity += pow(r_dot_v, specular)
+
+    return intensity
+
+
+def compute_lighting(point: Vec3, normal: Vec3, view: Vec3, scene: Scene, specular: Optional[float]) -> float:
+    # normal and view have to be unit length, so they drop out of the cosines below
+    intensity = scene.ambient_intensity
+    n_dot_v = dot(normal, view)
+    (p_x, p_y, p_z) = point
+    # matte or not is settled once per hit, not once per light
+    incoming_light = _diffuse_light if specular is None else _shiny_light
+
+    for (light_intensity, (l_x, l_y, l_z)) in scene.point_lights:
+        # a unit ray towards the light, and the light is length_r along it
+        ray = (l_x - p_x, l_y - p_y, l_z - p_z)
+        length_r = length(ray)
+        ray = (ray[0] / length_r, ray[1] / length_r, ray[2] / length_r)
+        intensity += light_intensity * incoming_light(point, normal, view, ray, length_r, scene.spheres, specular, n_dot_v)
+
+    for (light_intensity, ray) in scene.directional_lights:
+        intensity += light_intensity * incoming_light(point, normal, view, ray, POS_INF, scene.spheres, specular, n_dot_v)
 
     return intensity
 
 
 def closest_intersection(origin: Vec3, direction: Vec3, t_min: float, t_max: float, spheres: list[Sphere]):
-    closest_t = POS_INF
+    closest_t = t_max
     closest_sphere = None
 
+    # closest_t shrinks as hits are found, so later spheres behind them are skipped early
     for sphere in spheres:
-        (t_1, t_2) = intersect_ray_sphere(origin, direction, sphere)
-        if t_1 < closest_t and t_min < t_1 < t_max:
-            closest_t = t_1
-            closest_sphere = sphere
-
-        if t_2 < closest_t and t_min < t_2 < t_max:
-            closest_t = t_2
+        t = intersect_ray_sphere(origin, direction, sphere, t_min, closest_t)
+        if t_min < t < closest_t:
+            closest_t = t
             closest_sphere = sphere
 
     return (closest_sphere, closest_t)
 
 
+def any_intersection(origin: Vec3, direction: Vec3, t_min: float, t_max: float, spheres: list[Sphere]) -> bool:
+    # shadows only care whether something is in the way, so stop at the first hit
+    for sphere in spheres:
+        if t_min < intersect_ray_sphere(origin, direction, sphere, t_min, t_max) < t_max:
+            return True
+    return False
+
+
 def trace_ray(origin: Vec3, direction: Vec3, t_min: float, t_max: float, scene: Scene, recursion_depth: int = 0) -> Color:
+    # direction has to be unit length, and t is a distance along it
     (closest_sphere, closest_t) = closest_intersection(origin, direction, t_min, t_max, scene.spheres)
 
     if closest_sphere is None:
         return BACKGROUND_COLOR
 
-    point: Vec3 = add(origin, scalar_multiply(direction, closest_t));
-    normal: Vec3 = subtract(point, closest_sphere.center);
-    normal = scalar_multiply(normal, 1.0 / length(normal));
+    (d_x, d_y, d_z) = direction
+    point: Vec3 = (origin[0] + d_x*closest_t, origin[1] + d_y*closest_t, origin[2] + d_z*closest_t)
+    (c_x, c_y, c_z) = closest_sphere.center
+    n_x = point[0] - c_x
+    n_y = point[1] - c_y
+    n_z = point[2] - c_z
+    inv_length_n = 1.0 / sqrt(n_x*n_x + n_y*n_y + n_z*n_z)
+    normal: Vec3 = (n_x*inv_length_n, n_y*inv_length_n, n_z*inv_length_n)
 
-    view: Vec3 = scalar_multiply(direction, -1.0)
-    lighting: float = compute_lighting(point, normal, view, scene.spheres, scene.lights, closest_sphere.specular)
-    local_color = scalar_multiply(closest_sphere.color, lighting)
+    view: Vec3 = (-d_x, -d_y, -d_z)
+    lighting: float = compute_lighting(point, normal, view, scene, closest_sphere.specular)
+    (red, green, blue) = closest_sphere.color
+    local_color = (red*lighting, green*lighting, blue*lighting)
 
     r = closest_sphere.reflective
     if recursion_depth <= 0 or r <=0:
@@ -201,23 +250,57 @@ def trace_ray(origin: Vec3, direction: Vec3, t_min: float, t_max: float, scene:
     reflected_ray = reflect_ray(normal, view)
     reflected_color = trace_ray(point, reflected_ray, EPSILON, POS_INF, scene, recursion_depth - 1)
 
-    return add(scalar_multiply(local_color, 1.0 - r), scalar_multiply(reflected_color, r))
+    k = 1.0 - r
+    return (local_color[0]*k + reflected_color[0]*r, local_color[1]*k + reflected_color[1]*r, local_color[2]*k + reflected_color[2]*r)
+
+
+def render_tile(scene: Scene, camera_position: Vec3, canvas_size: tuple[int, int], row_start: int, row_end: int) -> bytearray:
+    (c_w, c_h) = canvas_size
+    # canvas to viewport scale, a ray through the viewport is (x * s_x, y * s_y, p_z)
+    s_x = scene.viewport_size / c_w
+    s_y = scene.viewport_size / c_h
+    p_z = scene.projection_plane
+
+    # rgb bytes in scanline order, ready for Image.frombytes
+    tile = bytearray(3 * c_w * (row_end - row_start))
+    i = 0
+    for row in range(row_start, row_end):
+        d_y = (c_h // 2 - 1 - row) * s_y
+        for x in range(-(c_w // 2), c_w - c_w // 2):
+            d_x = x * s_x
+            # unit direction, starting from the viewport (where t = its length)
+            length_d = sqrt(d_x*d_x + d_y*d_y + p_z*p_z)
+            direction = (d_x / length_d, d_y / length_d, p_z / length_d)
+            (red, green, blue) = trace_ray(camera_position, direction, length_d, POS_INF, scene, 2)
+            tile[i] = _clamp_value(red)
+            tile[i + 1] = _clamp_value(green)
+            tile[i + 2] = _clamp_value(blue)
+            i += 3
+    return tile
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3, workers: Optional[int] = None) -> None:
+    (c_w, c_h) = img.size
+    # cpu_count is None when it can't be worked out
+    workers = workers or os.cpu_count() or 1
+    render = partial(render_tile, scene, camera_position, img.size)
 
+    # more tiles than workers, so the busy rows near the floor get shared out
+    rows = max(1, c_h // (4 * workers))
+    row_starts = range(0, c_h, rows)
+    row_ends = [min(start + rows, c_h) for start in row_starts]
 
-def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
-    (c_w, c_h) = img.size
-    pixels = img.load()
-    for x in range(int(-c_w/2), int(c_w/2)):
-        for y in range(int(-c_h/2), int(c_h/2)):
-            direction = canvas_to_viewport((x, y), img, scene)
-            color = trace_ray(camera_position, direction, 1.0, POS_INF, scene, 2)
-            put_pixel(img, pixels, (x, y), clamp(color))
+    if workers == 1:
+        img.frombytes(b''.join(map(render, row_starts, row_ends)))
+        return
 
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        img.frombytes(b''.join(pool.map(render, row_starts, row_ends)))
 
-def main() -> None:
+
+def build_scene() -> Scene:
     viewport_size = 1
     projection_plane_z = 1
-    camera_position = (0., 0., 0.)
     spheres = [
         Sphere((0., -1, 3), 1., RED, 500, 0.2),
         Sphere((2, 0., 4), 1., BLUE, 500, 0.3),
@@ -230,13 +313,18 @@ def main() -> None:
         Light(LightType.POINT, 0.6, position=(2., 1., 0.)),
         Light(LightType.DIRECTIONAL, 0.2, direction=(1., 4., 4.)),
     ]
-    scene = Scene(
+    return Scene(
         viewport_size,
         projection_plane_z,
         BACKGROUND_COLOR,
         spheres,
         lights
         )
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
     img = create_image(600, 600)
     draw_scene(scene, img, camera_position)
     img.show()
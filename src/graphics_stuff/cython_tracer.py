@@ -0,0 +1,28 @@
+import numpy as np
+import pyximport
+from PIL import Image
+
+from graphics_stuff.basic_tracer import Scene, Vec3, build_scene, create_image
+
+# compiles _cython_tracer.pyx on first import, with the flags in _cython_tracer.pyxbld
+pyximport.install(language_level=3)
+
+from graphics_stuff import _cython_tracer
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
+    (c_w, c_h) = img.size
+    pixels = np.empty((c_h, c_w, 3), dtype=np.uint8)
+    _cython_tracer.render(pixels, float(scene.viewport_size), float(scene.projection_plane), camera_position, scene)
+    img.paste(Image.frombuffer('RGB', (c_w, c_h), pixels, 'raw', 'RGB', 0, 1))
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
+    img = create_image(600, 600)
+    draw_scene(scene, img, camera_position)
+    img.show()
+
+
+if __name__=='__main__': main()
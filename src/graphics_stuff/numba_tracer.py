@@ -0,0 +1,238 @@
+from math import sqrt
+from typing import NamedTuple
+
+import numpy as np
+from numba import njit, prange
+from PIL import Image
+
+from graphics_stuff.basic_tracer import (
+    BACKGROUND_COLOR,
+    EPSILON,
+    NO_SPECULAR,
+    POS_INF,
+    LightType,
+    Scene,
+    Vec3,
+    build_scene,
+    create_image,
+)
+
+# fastmath without 'nnan' and 'ninf': misses are reported as POS_INF, so
+# llvm must not assume infinities away
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+AMBIENT = np.int8(LightType.AMBIENT.value)
+POINT = np.int8(LightType.POINT.value)
+
+
+class SceneArrays(NamedTuple):
+    sphere_centers: np.ndarray
+    sphere_r2: np.ndarray
+    sphere_colors: np.ndarray
+    sphere_specular: np.ndarray
+    sphere_reflective: np.ndarray
+    light_type: np.ndarray
+    light_intensity: np.ndarray
+    light_position: np.ndarray
+    light_direction: np.ndarray
+
+
+def scene_arrays(scene: Scene) -> SceneArrays:
+    # numba can't work with the python objects, so it gets the scene's arrays.
+    # sphere_specular has to stay floats: with an integer exponent, or a float
+    # converted from one, llvm lowers pow to __powidf2, which doesn't link under fastmath
+    return SceneArrays(
+        scene.sphere_centers,
+        scene.sphere_r2,
+        scene.sphere_colors,
+        scene.sphere_specular,
+        scene.sphere_reflective,
+        scene.light_type,
+        scene.light_intensity,
+        scene.light_position,
+        scene.light_direction,
+    )
+
+
+@njit(fastmath=FASTMATH, cache=True)
+def intersect_ray_sphere(o_x, o_y, o_z, d_x, d_y, d_z, sphere_centers, sphere_r2, i):
+    # d has to be unit length, see basic_tracer.intersect_ray_sphere
+    co_x = o_x - sphere_centers[i, 0]
+    co_y = o_y - sphere_centers[i, 1]
+    co_z = o_z - sphere_centers[i, 2]
+    b = co_x*d_x + co_y*d_y + co_z*d_z
+    c = co_x*co_x + co_y*co_y + co_z*co_z - sphere_r2[i]
+
+    discriminant = b*b - c
+
+    # no real solutions, so there's no intersection
+    if discriminant < 0.0:
+        return (POS_INF, POS_INF)
+
+    sqrt_disc = sqrt(discriminant)
+
+    t_1 = -b + sqrt_disc
+    t_2 = -b - sqrt_disc
+    return (t_1, t_2)
+
+
+@njit(fastmath=FASTMATH, cache=True)
+def closest_intersection(o_x, o_y, o_z, d_x, d_y, d_z, t_min, t_max, sphere_centers, sphere_r2):
+    closest_t = POS_INF
+    closest_sphere = -1
+
+    for i in range(sphere_r2.shape[0]):
+        (t_1, t_2) = intersect_ray_sphere(o_x, o_y, o_z, d_x, d_y, d_z, sphere_centers, sphere_r2, i)
+        if t_1 < closest_t and t_min < t_1 < t_max:
+            closest_t = t_1
+            closest_sphere = i
+
+        if t_2 < closest_t and t_min < t_2 < t_max:
+            closest_t = t_2
+            closest_sphere = i
+
+    return (closest_sphere, closest_t)
+
+
+@njit(fastmath=FASTMATH, cache=True)
+def any_intersection(o_x, o_y, o_z, d_x, d_y, d_z, t_min, t_max, sphere_centers, sphere_r2):
+    for i in range(sphere_r2.shape[0]):
+        (t_1, t_2) = intersect_ray_sphere(o_x, o_y, o_z, d_x, d_y, d_z, sphere_centers, sphere_r2, i)
+        if t_min < t_1 < t_max or t_min < t_2 < t_max:
+            return True
+    return False
+
+
+@njit(fastmath=FASTMATH, cache=True)
+def compute_lighting(p_x, p_y, p_z, n_x, n_y, n_z, v_x, v_y, v_z, specular, arrays):
+    # n and v have to be unit length, see basic_tracer.compute_lighting
+    intensity = 0.0
+    n_dot_v = n_x*v_x + n_y*v_y + n_z*v_z
+
+    for i in range(arrays.light_type.shape[0]):
+        light_intensity = arrays.light_intensity[i]
+        if arrays.light_type[i] == AMBIENT:
+            intensity += light_intensity
+            continue
+
+        if arrays.light_type[i] == POINT:
+            l_x = arrays.light_position[i, 0] - p_x
+            l_y = arrays.light_position[i, 1] - p_y
+            l_z = arrays.light_position[i, 2] - p_z
+            t_max = sqrt(l_x*l_x + l_y*l_y + l_z*l_z)
+            inv_length_l = 1.0 / t_max
+            l_x *= inv_length_l
+            l_y *= inv_length_l
+            l_z *= inv_length_l
+        else:
+            l_x = float(arrays.light_direction[i, 0])
+            l_y = float(arrays.light_direction[i, 1])
+            l_z = float(arrays.light_direction[i, 2])
+            t_max = POS_INF
+
+        # shadow check
+        if any_intersection(p_x, p_y, p_z, l_x, l_y, l_z, EPSILON, t_max, arrays.sphere_centers, arrays.sphere_r2):
+            continue
+
+        # diffuse lighting
+        n_dot_l = n_x*l_x + n_y*l_y + n_z*l_z
+        if n_dot_l > 0.0:
+            intensity += light_intensity * n_dot_l
+
+        # specular lighting, see basic_tracer._shiny_light
+        r_dot_v = 2.0 * n_dot_l * n_dot_v - (l_x*v_x + l_y*v_y + l_z*v_z)
+        if specular != NO_SPECULAR and r_dot_v > 0.0:
+            intensity += light_intensity * r_dot_v ** specular
+
+    return intensity
+
+
+@njit(fastmath=FASTMATH, cache=True)
+def trace_ray(o_x, o_y, o_z, d_x, d_y, d_z, t_min, t_max, arrays, recursion_depth):
+    # the reflection recursion unrolled into a loop: each bounce contributes
+    # (1 - r) of its own color and hands the remaining r on to the next one
+    red = 0.0
+    green = 0.0
+    blue = 0.0
+    weight = 1.0
+
+    while True:
+        (closest_sphere, closest_t) = closest_intersection(o_x, o_y, o_z, d_x, d_y, d_z, t_min, t_max, arrays.sphere_centers, arrays.sphere_r2)
+
+        if closest_sphere < 0:
+            red += weight * BACKGROUND_COLOR[0]
+            green += weight * BACKGROUND_COLOR[1]
+            blue += weight * BACKGROUND_COLOR[2]
+            break
+
+        p_x = o_x + d_x*closest_t
+        p_y = o_y + d_y*closest_t
+        p_z = o_z + d_z*closest_t
+        n_x = p_x - arrays.sphere_centers[closest_sphere, 0]
+        n_y = p_y - arrays.sphere_centers[closest_sphere, 1]
+        n_z = p_z - arrays.sphere_centers[closest_sphere, 2]
+        inv_length_n = 1.0 / sqrt(n_x*n_x + n_y*n_y + n_z*n_z)
+        n_x *= inv_length_n
+        n_y *= inv_length_n
+        n_z *= inv_length_n
+
+        lighting = compute_lighting(p_x, p_y, p_z, n_x, n_y, n_z, -d_x, -d_y, -d_z, arrays.sphere_specular[closest_sphere], arrays)
+
+        r = arrays.sphere_reflective[closest_sphere]
+        k = weight if recursion_depth <= 0 or r <= 0.0 else weight * (1.0 - r)
+        red += k * arrays.sphere_colors[closest_sphere, 0] * lighting
+        green += k * arrays.sphere_colors[closest_sphere, 1] * lighting
+        blue += k * arrays.sphere_colors[closest_sphere, 2] * lighting
+        if recursion_depth <= 0 or r <= 0.0:
+            break
+
+        # reflect the view ray (-d) about the normal
+        s = -2.0 * (n_x*d_x + n_y*d_y + n_z*d_z)
+        d_x = n_x*s + d_x
+        d_y = n_y*s + d_y
+        d_z = n_z*s + d_z
+        o_x = p_x
+        o_y = p_y
+        o_z = p_z
+        t_min = EPSILON
+        t_max = POS_INF
+        weight *= r
+        recursion_depth -= 1
+
+    return (red, green, blue)
+
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def render(pixels, viewport_size, projection_plane, o_x, o_y, o_z, arrays):
+    (c_h, c_w, _) = pixels.shape
+    s_x = viewport_size / c_w
+    s_y = viewport_size / c_h
+    for j in prange(c_h):
+        d_y = (c_h // 2 - 1 - j) * s_y
+        for i in range(c_w):
+            d_x = (i - c_w // 2) * s_x
+            length_d = sqrt(d_x*d_x + d_y*d_y + projection_plane*projection_plane)
+            inv_length_d = 1.0 / length_d
+            (red, green, blue) = trace_ray(o_x, o_y, o_z, d_x * inv_length_d, d_y * inv_length_d, projection_plane * inv_length_d, length_d, POS_INF, arrays, 2)
+            pixels[j, i, 0] = min(255.0, max(0.0, red))
+            pixels[j, i, 1] = min(255.0, max(0.0, green))
+            pixels[j, i, 2] = min(255.0, max(0.0, blue))
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
+    (c_w, c_h) = img.size
+    pixels = np.empty((c_h, c_w, 3), dtype=np.uint8)
+    (o_x, o_y, o_z) = camera_position
+    render(pixels, float(scene.viewport_size), float(scene.projection_plane), float(o_x), float(o_y), float(o_z), scene_arrays(scene))
+    img.paste(Image.frombuffer('RGB', (c_w, c_h), pixels, 'raw', 'RGB', 0, 1))
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
+    img = create_image(600, 600)
+    draw_scene(scene, img, camera_position)
+    img.show()
+
+
+if __name__=='__main__': main()
@@ -0,0 +1,190 @@
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+from graphics_stuff.basic_tracer import (
+    BACKGROUND_COLOR,
+    EPSILON,
+    NO_SPECULAR,
+    POS_INF,
+    LightType,
+    Scene,
+    Vec3,
+    build_scene,
+    create_image,
+    normalize,
+)
+
+# every function here works on a batch of rays at once: points, normals and
+# directions are (N, 3) arrays, and per-ray scalars are (N,) arrays. results
+# per ray and sphere are (N, S) arrays.
+#
+# colors and light intensities are float32, they end up as 8 bits anyway.
+# positions and directions stay float64, see Scene in basic_tracer.
+
+
+###### algebra ######
+def dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(-1)
+
+
+def length(a: np.ndarray) -> np.ndarray:
+    return np.sqrt(dot(a, a))
+
+
+#########################
+
+
+def canvas_to_viewport(width: int, height: int, scene: Scene) -> tuple[np.ndarray, np.ndarray]:
+    # one unit direction per pixel, in scanline order (top row first), and how
+    # far along it the viewport is. both float64
+    xs = np.arange(-(width // 2), width - width // 2)
+    ys = np.arange(height // 2 - 1, height // 2 - 1 - height, -1)
+    d_x, d_y = np.meshgrid(xs * scene.viewport_size / width, ys * scene.viewport_size / height)
+    d_z = np.full_like(d_x, scene.projection_plane)
+    directions = np.stack([d_x.ravel(), d_y.ravel(), d_z.ravel()], -1)
+    lengths = length(directions)
+    directions /= lengths[:, None]
+    return (directions, lengths)
+
+
+def intersect_rays_spheres(origins: np.ndarray, directions: np.ndarray, centers: np.ndarray, r2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # directions have to be unit length, see basic_tracer.intersect_ray_sphere
+    origin_to_spheres = np.expand_dims(origins, -2) - centers
+
+    b = dot(origin_to_spheres, directions[:, None, :])
+    c = dot(origin_to_spheres, origin_to_spheres) - r2
+
+    discriminant = b*b - c
+
+    # no real solutions, so there's no intersection
+    missed = discriminant < 0
+    sqrt_disc = np.sqrt(np.where(missed, 0., discriminant))
+
+    t_1 = np.where(missed, POS_INF, -b + sqrt_disc)
+    t_2 = np.where(missed, POS_INF, -b - sqrt_disc)
+    return (t_1, t_2)
+
+
+def reflect_rays(normals: np.ndarray, rays: np.ndarray) -> np.ndarray:
+    return normals * (2 * dot(normals, rays))[:, None] - rays
+
+
+def closest_intersections(origins: np.ndarray, directions: np.ndarray, t_min: Union[float, np.ndarray], t_max: float, scene: Scene) -> tuple[np.ndarray, np.ndarray]:
+    # index into scene.spheres of the closest hit per ray, -1 where nothing was hit.
+    # t_min is either one for all rays or an (N, 1) array, one per ray
+    if len(scene.sphere_r2) == 0:
+        # argmin has nothing to pick from
+        return (np.full(len(directions), -1), np.full(len(directions), POS_INF))
+
+    (t_1, t_2) = intersect_rays_spheres(origins, directions, scene.sphere_centers, scene.sphere_r2)
+    t_1 = np.where((t_min < t_1) & (t_1 < t_max), t_1, POS_INF)
+    t_2 = np.where((t_min < t_2) & (t_2 < t_max), t_2, POS_INF)
+    t = np.minimum(t_1, t_2)
+
+    closest_sphere = t.argmin(-1)
+    closest_t = np.take_along_axis(t, closest_sphere[:, None], -1)[:, 0]
+    closest_sphere[closest_t == POS_INF] = -1
+    return (closest_sphere, closest_t)
+
+
+def any_intersections(origins: np.ndarray, directions: np.ndarray, t_min: float, t_max: Union[float, np.ndarray], scene: Scene) -> np.ndarray:
+    # whether each ray hits anything at all, which is all a shadow needs.
+    # t_max is either one for all rays or an (N, 1) array, one per ray
+    if len(scene.sphere_r2) == 0:
+        return np.zeros(len(directions), dtype=bool)
+
+    (t_1, t_2) = intersect_rays_spheres(origins, directions, scene.sphere_centers, scene.sphere_r2)
+    return (((t_min < t_1) & (t_1 < t_max)) | ((t_min < t_2) & (t_2 < t_max))).any(-1)
+
+
+def compute_lighting(points: np.ndarray, normals: np.ndarray, views: np.ndarray, scene: Scene, specular: np.ndarray) -> np.ndarray:
+    # normals and views have to be unit length, see basic_tracer.compute_lighting
+    intensity = np.zeros(len(points), dtype=np.float32)
+    n_dot_v = dot(normals, views)
+
+    for light in scene.lights:
+        if light.light_type == LightType.AMBIENT:
+            intensity += light.intensity
+            continue
+
+        if light.light_type == LightType.POINT:
+            rays = np.asarray(light.position) - points
+            t_max = length(rays)[:, None]
+            rays /= t_max
+        else:
+            rays = np.broadcast_to(normalize(light.direction), points.shape)
+            t_max = POS_INF
+
+        # shadow check
+        lit = ~any_intersections(points, rays, EPSILON, t_max, scene)
+
+        # diffuse lighting
+        n_dot_r = dot(normals, rays)
+        diffuse = lit & (n_dot_r > 0)
+        intensity[diffuse] += light.intensity * n_dot_r[diffuse]
+
+        # specular lighting, see basic_tracer._shiny_light
+        r_dot_v = 2 * n_dot_r * n_dot_v - dot(rays, views)
+        shiny = lit & (r_dot_v > 0) & (specular != NO_SPECULAR)
+        # cos**specular as exp(specular * log(cos)): numpy's float32 exp and log are simd, its power isn't
+        cos_rv = r_dot_v[shiny].astype(np.float32)
+        intensity[shiny] += light.intensity * np.exp(specular[shiny].astype(np.float32) * np.log(cos_rv))
+
+    return intensity
+
+
+def trace_rays(origins: np.ndarray, directions: np.ndarray, t_min: Union[float, np.ndarray], t_max: float, scene: Scene, recursion_depth: int = 0) -> np.ndarray:
+    colors = np.empty((len(directions), 3), dtype=np.float32)
+    colors[:] = BACKGROUND_COLOR
+
+    (closest_sphere, closest_t) = closest_intersections(origins, directions, t_min, t_max, scene)
+    hit = closest_sphere >= 0
+    if not hit.any():
+        return colors
+
+    sphere_index = closest_sphere[hit]
+    centers = scene.sphere_centers[sphere_index]
+    sphere_colors = scene.sphere_colors[sphere_index]
+    specular = scene.sphere_specular[sphere_index]
+    r = scene.sphere_reflective[sphere_index]
+
+    directions = directions[hit]
+    points = np.broadcast_to(origins, colors.shape)[hit] + directions * closest_t[hit, None]
+    normals = points - centers
+    normals /= length(normals)[:, None]
+
+    views = -directions
+    lighting = compute_lighting(points, normals, views, scene, specular)
+    local_colors = sphere_colors * lighting[:, None]
+
+    reflective = r > 0
+    if recursion_depth > 0 and reflective.any():
+        reflected_rays = reflect_rays(normals[reflective], views[reflective])
+        reflected_colors = trace_rays(points[reflective], reflected_rays, EPSILON, POS_INF, scene, recursion_depth - 1)
+        r = r[reflective, None]
+        local_colors[reflective] = local_colors[reflective] * (1.0 - r) + reflected_colors * r
+
+    colors[hit] = local_colors
+    return colors
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
+    (c_w, c_h) = img.size
+    # rays start at the viewport, which is a different distance away for each pixel
+    (directions, lengths) = canvas_to_viewport(c_w, c_h, scene)
+    colors = trace_rays(np.asarray(camera_position, dtype=float), directions, lengths[:, None], POS_INF, scene, 2)
+    pixels = np.ascontiguousarray(np.clip(colors, 0, 255).astype(np.uint8).reshape(c_h, c_w, 3))
+    img.paste(Image.frombuffer('RGB', (c_w, c_h), pixels, 'raw', 'RGB', 0, 1))
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
+    img = create_image(600, 600)
+    draw_scene(scene, img, camera_position)
+    img.show()
+
+
+if __name__=='__main__': main()
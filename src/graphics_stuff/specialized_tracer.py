@@ -0,0 +1,203 @@
+from math import sqrt, pow
+from typing import Callable
+
+from PIL import Image
+
+from graphics_stuff.basic_tracer import (
+    BACKGROUND_COLOR,
+    EPSILON,
+    POS_INF,
+    Scene,
+    Sphere,
+    Vec3,
+    _clamp_value,
+    build_scene,
+    create_image,
+)
+
+# basic_tracer partially evaluated for one scene: the source of a trace_ray with
+# every sphere and light written out as literals, so there are no loops over
+# the scene, no attribute lookups and no checks of light or sphere settings
+# left. same rules as basic_tracer: directions are unit length and t is a distance.
+
+TraceRay = Callable[[float, float, float, float, float, float, float, int], tuple[float, float, float]]
+
+
+def _indent(lines: list[str], depth: int = 1) -> list[str]:
+    return ['    ' * depth + line for line in lines]
+
+
+def _hit_test(sphere: Sphere, origin: str, direction: str, t_max: str, on_hit: list[str]) -> list[str]:
+    # sets t to the sphere's nearest root past t_min, and runs on_hit when it's before t_max.
+    # see intersect_ray_sphere for the math.
+    (c_x, c_y, c_z) = (float(c) for c in sphere.center)
+    (o_x, o_y, o_z) = (f'{origin}_x', f'{origin}_y', f'{origin}_z')
+    (d_x, d_y, d_z) = (f'{direction}_x', f'{direction}_y', f'{direction}_z')
+    return [
+        f'co_x = {o_x} - {c_x!r}',
+        f'co_y = {o_y} - {c_y!r}',
+        f'co_z = {o_z} - {c_z!r}',
+        f'b = co_x*{d_x} + co_y*{d_y} + co_z*{d_z}',
+        f'c = co_x*co_x + co_y*co_y + co_z*co_z - {float(sphere.r2)!r}',
+        f'if c <= 0 or not (b > 0 or c > {t_max} * ({t_max} + {2.0 * sphere.radius!r})):',
+        '    discriminant = b*b - c',
+        '    if discriminant >= 0:',
+        '        sqrt_disc = sqrt(discriminant)',
+        '        t = -b - sqrt_disc',
+        '        if t <= t_min:',
+        '            t = -b + sqrt_disc',
+        f'        if t_min < t < {t_max}:',
+        *_indent(on_hit, 3),
+    ]
+
+
+def _blocked_source(scene: Scene) -> list[str]:
+    # any_intersection, for shadow rays from p along the unit vector l
+    lines = [
+        'def blocked(p_x, p_y, p_z, l_x, l_y, l_z, t_max):',
+        '    t_min = EPSILON',
+    ]
+    for sphere in scene.spheres:
+        lines += _indent(_hit_test(sphere, 'p', 'l', 't_max', ['return True']))
+    lines.append('    return False')
+    return lines
+
+
+def _lighting_source(scene: Scene, specular: int) -> list[str]:
+    # compute_lighting for a hit at p with unit normal n, seen along the unit ray d
+    lines = [f'intensity = {float(scene.ambient_intensity)!r}']
+
+    def incoming_light(light_intensity: float, l: Vec3, t_max: str) -> list[str]:
+        (l_x, l_y, l_z) = l
+        shading = [
+            f'n_dot_l = n_x*{l_x} + n_y*{l_y} + n_z*{l_z}',
+            'if n_dot_l > 0:',
+            f'    intensity += {float(light_intensity)!r} * n_dot_l',
+        ]
+        if specular is not None:
+            # view is -d, so -l.view is l.d
+            shading += [
+                f'r_dot_v = 2 * n_dot_l * n_dot_v + ({l_x}*d_x + {l_y}*d_y + {l_z}*d_z)',
+                'if r_dot_v > 0:',
+                f'    intensity += {float(light_intensity)!r} * pow(r_dot_v, {specular!r})',
+            ]
+        return [f'if not blocked(p_x, p_y, p_z, {l_x}, {l_y}, {l_z}, {t_max}):', *_indent(shading)]
+
+    for (light_intensity, (p_x, p_y, p_z)) in scene.point_lights:
+        lines += [
+            f'l_x = {float(p_x)!r} - p_x',
+            f'l_y = {float(p_y)!r} - p_y',
+            f'l_z = {float(p_z)!r} - p_z',
+            'length_l = sqrt(l_x*l_x + l_y*l_y + l_z*l_z)',
+            'l_x /= length_l',
+            'l_y /= length_l',
+            'l_z /= length_l',
+            *incoming_light(light_intensity, ('l_x', 'l_y', 'l_z'), 'length_l'),
+        ]
+
+    for (light_intensity, direction) in scene.directional_lights:
+        literal = tuple(repr(float(c)) for c in direction)
+        lines += incoming_light(light_intensity, literal, 'POS_INF')
+
+    return lines
+
+
+def _shade_source(sphere: Sphere, scene: Scene) -> list[str]:
+    # the rest of trace_ray once we know we hit this sphere at p
+    (c_x, c_y, c_z) = (float(c) for c in sphere.center)
+    # p is on the sphere, so p - center is exactly a radius long
+    inv_radius = 1.0 / sphere.radius
+    lines = [
+        f'n_x = (p_x - {c_x!r}) * {inv_radius!r}',
+        f'n_y = (p_y - {c_y!r}) * {inv_radius!r}',
+        f'n_z = (p_z - {c_z!r}) * {inv_radius!r}',
+        'n_dot_d = n_x*d_x + n_y*d_y + n_z*d_z',
+        'n_dot_v = -n_dot_d',
+        *_lighting_source(scene, sphere.specular),
+    ]
+    local_color = [f'{float(c)!r} * intensity' if c else '0.0' for c in sphere.color]
+
+    r = float(sphere.reflective)
+    if r <= 0:
+        return lines + [f'return ({", ".join(local_color)})']
+
+    (red, green, blue) = local_color
+    return lines + [
+        'if recursion_depth <= 0:',
+        f'    return ({red}, {green}, {blue})',
+        '# reflect the view ray (-d) about the normal',
+        's = 2 * n_dot_d',
+        '(r_red, r_green, r_blue) = trace_ray(p_x, p_y, p_z, d_x - n_x*s, d_y - n_y*s, d_z - n_z*s, EPSILON, recursion_depth - 1)',
+        f'return ({red} * {1.0 - r!r} + r_red * {r!r}, {green} * {1.0 - r!r} + r_green * {r!r}, {blue} * {1.0 - r!r} + r_blue * {r!r})',
+    ]
+
+
+def _trace_ray_source(scene: Scene) -> list[str]:
+    lines = [
+        'def trace_ray(o_x, o_y, o_z, d_x, d_y, d_z, t_min, recursion_depth):',
+        '    closest_t = POS_INF',
+        '    closest_sphere = -1',
+    ]
+    for (i, sphere) in enumerate(scene.spheres):
+        lines += _indent(_hit_test(sphere, 'o', 'd', 'closest_t', ['closest_t = t', f'closest_sphere = {i}']))
+
+    lines += [
+        '    if closest_sphere < 0:',
+        '        return BACKGROUND_COLOR',
+        '    p_x = o_x + d_x*closest_t',
+        '    p_y = o_y + d_y*closest_t',
+        '    p_z = o_z + d_z*closest_t',
+    ]
+    for (i, sphere) in enumerate(scene.spheres):
+        lines.append(f'    if closest_sphere == {i}:')
+        lines += _indent(_shade_source(sphere, scene), 2)
+    return lines
+
+
+def specialize(scene: Scene) -> TraceRay:
+    # trace_ray(o_x, o_y, o_z, d_x, d_y, d_z, t_min, recursion_depth) -> color, for
+    # rays that go on forever; the scene is baked in
+    source = '\n'.join(_blocked_source(scene) + [''] + _trace_ray_source(scene)) + '\n'
+    namespace = {
+        'sqrt': sqrt,
+        'pow': pow,
+        'POS_INF': POS_INF,
+        'EPSILON': EPSILON,
+        'BACKGROUND_COLOR': BACKGROUND_COLOR,
+    }
+    exec(compile(source, '<specialized scene>', 'exec'), namespace)
+    return namespace['trace_ray']
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
+    (c_w, c_h) = img.size
+    trace_ray = specialize(scene)
+    (o_x, o_y, o_z) = camera_position
+    s_x = scene.viewport_size / c_w
+    s_y = scene.viewport_size / c_h
+    p_z = scene.projection_plane
+
+    pixels = bytearray(3 * c_w * c_h)
+    i = 0
+    for row in range(c_h):
+        d_y = (c_h // 2 - 1 - row) * s_y
+        for x in range(-(c_w // 2), c_w - c_w // 2):
+            d_x = x * s_x
+            length_d = sqrt(d_x*d_x + d_y*d_y + p_z*p_z)
+            (red, green, blue) = trace_ray(o_x, o_y, o_z, d_x / length_d, d_y / length_d, p_z / length_d, length_d, 2)
+            pixels[i] = _clamp_value(red)
+            pixels[i + 1] = _clamp_value(green)
+            pixels[i + 2] = _clamp_value(blue)
+            i += 3
+    img.frombytes(bytes(pixels))
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
+    img = create_image(600, 600)
+    draw_scene(scene, img, camera_position)
+    img.show()
+
+
+if __name__=='__main__': main()
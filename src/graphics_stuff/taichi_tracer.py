@@ -0,0 +1,214 @@
+import taichi as ti
+from PIL import Image
+
+from graphics_stuff.basic_tracer import (
+    BACKGROUND_COLOR,
+    EPSILON,
+    NO_SPECULAR,
+    LightType,
+    Scene,
+    Vec3,
+    build_scene,
+    create_image,
+    normalize,
+)
+
+vec3 = ti.math.vec3
+POS_INF = ti.math.inf
+
+AMBIENT = LightType.AMBIENT.value
+POINT = LightType.POINT.value
+
+SphereStruct = ti.types.struct(center=vec3, r2=ti.f64, color=vec3, specular=ti.f64, reflective=ti.f64)
+LightStruct = ti.types.struct(light_type=ti.i32, intensity=ti.f64, position=vec3, direction=vec3)
+
+_initialized = False
+
+
+def init(arch=ti.cpu) -> None:
+    # has to run before any fields are made, draw_scene does it if nobody has.
+    # TI_ARCH=cuda or TI_ARCH=vulkan overrides the arch; metal and opengl have
+    # no f64, so they won't do.
+    # fast_math is off because misses are reported as an infinite t, and that
+    # has to compare properly. f64 because of the floor, see Scene in basic_tracer.
+    global _initialized
+    ti.init(arch=arch, fast_math=False, default_fp=ti.f64)
+    _initialized = True
+
+
+def scene_fields(scene: Scene):
+    # fields can't be empty, so there's always at least one entry. the kernels
+    # loop over the real counts, len(scene.spheres) and len(scene.lights)
+    spheres = SphereStruct.field(shape=max(1, len(scene.spheres)))
+    for i, s in enumerate(scene.spheres):
+        spheres[i] = SphereStruct(center=s.center, r2=s.r2, color=s.color, specular=scene.sphere_specular[i], reflective=s.reflective)
+
+    lights = LightStruct.field(shape=max(1, len(scene.lights)))
+    for i, l in enumerate(scene.lights):
+        lights[i] = LightStruct(
+            light_type=l.light_type.value,
+            intensity=l.intensity,
+            position=l.position or (0., 0., 0.),
+            direction=normalize(l.direction) if l.direction else (0., 0., 0.),
+        )
+    return (spheres, lights)
+
+
+@ti.func
+def intersect_ray_sphere(origin: vec3, direction: vec3, center: vec3, r2: ti.f64):
+    # direction has to be unit length, see basic_tracer.intersect_ray_sphere
+    origin_to_sphere = origin - center
+
+    b = origin_to_sphere.dot(direction)
+    c = origin_to_sphere.dot(origin_to_sphere) - r2
+
+    discriminant = b*b - c
+
+    t_1 = POS_INF
+    t_2 = POS_INF
+    # no real solutions, so there's no intersection
+    if discriminant >= 0:
+        sqrt_disc = ti.sqrt(discriminant)
+        t_1 = -b + sqrt_disc
+        t_2 = -b - sqrt_disc
+    return (t_1, t_2)
+
+
+@ti.func
+def reflect_ray(normal: vec3, ray: vec3) -> vec3:
+    return normal * (2 * normal.dot(ray)) - ray
+
+
+@ti.func
+def closest_intersection(origin: vec3, direction: vec3, t_min: ti.f64, t_max: ti.f64, spheres: ti.template(), n_spheres: ti.i32):
+    closest_t = POS_INF
+    closest_sphere = -1
+
+    for i in range(n_spheres):
+        (t_1, t_2) = intersect_ray_sphere(origin, direction, spheres[i].center, spheres[i].r2)
+        if t_1 < closest_t and t_min < t_1 < t_max:
+            closest_t = t_1
+            closest_sphere = i
+
+        if t_2 < closest_t and t_min < t_2 < t_max:
+            closest_t = t_2
+            closest_sphere = i
+
+    return (closest_sphere, closest_t)
+
+
+@ti.func
+def any_intersection(origin: vec3, direction: vec3, t_min: ti.f64, t_max: ti.f64, spheres: ti.template(), n_spheres: ti.i32) -> ti.i32:
+    hit = 0
+    for i in range(n_spheres):
+        (t_1, t_2) = intersect_ray_sphere(origin, direction, spheres[i].center, spheres[i].r2)
+        if t_min < t_1 < t_max or t_min < t_2 < t_max:
+            hit = 1
+            break
+    return hit
+
+
+@ti.func
+def compute_lighting(point: vec3, normal: vec3, view: vec3, spheres: ti.template(), n_spheres: ti.i32, lights: ti.template(), n_lights: ti.i32, specular: ti.f64) -> ti.f64:
+    # normal and view have to be unit length, see basic_tracer.compute_lighting
+    intensity = 0.0
+    n_dot_v = normal.dot(view)
+
+    for i in range(n_lights):
+        light = lights[i]
+        if light.light_type == AMBIENT:
+            intensity += light.intensity
+        else:
+            ray = light.direction
+            t_max = POS_INF
+            if light.light_type == POINT:
+                ray = light.position - point
+                t_max = ray.norm()
+                ray /= t_max
+
+            # shadow check
+            if not any_intersection(point, ray, EPSILON, t_max, spheres, n_spheres):
+                # diffuse lighting
+                n_dot_r = normal.dot(ray)
+                if n_dot_r > 0:
+                    intensity += light.intensity * n_dot_r
+
+                # specular lighting, see basic_tracer._shiny_light
+                r_dot_v = 2 * n_dot_r * n_dot_v - ray.dot(view)
+                if specular != NO_SPECULAR and r_dot_v > 0:
+                    intensity += light.intensity * ti.pow(r_dot_v, specular)
+
+    return intensity
+
+
+@ti.func
+def trace_ray(origin: vec3, direction: vec3, t_min: ti.f64, t_max: ti.f64, spheres: ti.template(), n_spheres: ti.i32, lights: ti.template(), n_lights: ti.i32, recursion_depth: ti.i32) -> vec3:
+    # ti.func can't recurse, so reflections are a loop, see numba_tracer.trace_ray
+    color = vec3(0.)
+    weight = 1.0
+
+    while weight > 0:
+        (closest_sphere, closest_t) = closest_intersection(origin, direction, t_min, t_max, spheres, n_spheres)
+
+        if closest_sphere < 0:
+            color += weight * vec3(BACKGROUND_COLOR)
+            weight = 0.0
+        else:
+            sphere = spheres[closest_sphere]
+            point = origin + direction * closest_t
+            normal = (point - sphere.center).normalized()
+
+            view = -direction
+            lighting = compute_lighting(point, normal, view, spheres, n_spheres, lights, n_lights, sphere.specular)
+            local_color = sphere.color * lighting
+
+            r = sphere.reflective
+            if recursion_depth <= 0 or r <= 0:
+                color += weight * local_color
+                weight = 0.0
+            else:
+                color += weight * (1.0 - r) * local_color
+                weight *= r
+                origin = point
+                direction = reflect_ray(normal, view)
+                t_min = EPSILON
+                t_max = POS_INF
+                recursion_depth -= 1
+
+    return color
+
+
+@ti.kernel
+def render(pixels: ti.template(), spheres: ti.template(), n_spheres: ti.i32, lights: ti.template(), n_lights: ti.i32, camera_position: vec3, viewport_size: ti.f64, projection_plane: ti.f64):
+    (c_w, c_h) = pixels.shape
+    s_x = viewport_size / c_w
+    s_y = viewport_size / c_h
+    # pixels is indexed (column, row) from the top left, like the image
+    for i, j in pixels:
+        x = i - c_w // 2
+        y = c_h // 2 - 1 - j
+        direction = vec3(x * s_x, y * s_y, projection_plane)
+        length_d = direction.norm()
+        color = ti.math.clamp(trace_ray(camera_position, direction / length_d, length_d, POS_INF, spheres, n_spheres, lights, n_lights, 2), 0, 255)
+        pixels[i, j] = ti.cast(color, ti.u8)
+
+
+def draw_scene(scene: Scene, img: Image, camera_position: Vec3) -> None:
+    if not _initialized:
+        init()
+    (c_w, c_h) = img.size
+    pixels = ti.Vector.field(3, dtype=ti.u8, shape=(c_w, c_h))
+    (spheres, lights) = scene_fields(scene)
+    render(pixels, spheres, len(scene.spheres), lights, len(scene.lights), vec3(camera_position), scene.viewport_size, scene.projection_plane)
+    img.paste(Image.fromarray(pixels.to_numpy().transpose(1, 0, 2), 'RGB'))
+
+
+def main() -> None:
+    camera_position = (0., 0., 0.)
+    scene = build_scene()
+    img = create_image(600, 600)
+    draw_scene(scene, img, camera_position)
+    img.show()
+
+
+if __name__=='__main__': main()